@@ -59,7 +59,14 @@ CREATE TABLE IF NOT EXISTS FactHiring (
 -- =========================
 -- Helpful indexes
 -- =========================
-CREATE INDEX IF NOT EXISTS idx_fact_date ON FactHiring(date_id);
-CREATE INDEX IF NOT EXISTS idx_fact_country ON FactHiring(country_id);
-CREATE INDEX IF NOT EXISTS idx_fact_tech ON FactHiring(technology_id);
-CREATE INDEX IF NOT EXISTS idx_fact_sen ON FactHiring(seniority_id);
+-- Superseded by the covering indexes below (DWs built before them)
+DROP INDEX IF EXISTS idx_fact_date;
+DROP INDEX IF EXISTS idx_fact_country;
+DROP INDEX IF EXISTS idx_fact_tech;
+DROP INDEX IF EXISTS idx_fact_sen;
+
+-- FK + hired: KPI joins/aggregates (SUM(hired) GROUP BY dim) read the index only
+CREATE INDEX IF NOT EXISTS idx_fact_date_hired ON FactHiring(date_id, hired);
+CREATE INDEX IF NOT EXISTS idx_fact_country_date_hired ON FactHiring(country_id, date_id, hired);
+CREATE INDEX IF NOT EXISTS idx_fact_tech_hired ON FactHiring(technology_id, hired);
+CREATE INDEX IF NOT EXISTS idx_fact_sen_hired ON FactHiring(seniority_id, hired);
@@ -2,9 +2,12 @@
 # -*- coding: utf-8 -*-
 """
 ETL for Workshop-1 (enhanced with Rich logs and extra normalization)
-- Extract: reads data/candidates.csv (';' separator)
-- Transform: normalize columns, cast types, compute HIRED flag (>=7 on both scores), clean countries, add experience bands
+- Extract: streams data/candidates.csv (';' separator) in CSV_BLOCK_SIZE batches
+- Transform: normalize columns, cast types, compute HIRED flag (>=7 on both scores), clean countries
+  (experience bands are computed in SQL by the KPI queries from FactHiring.yoe)
 - Load: create SQLite DW (star schema) and load dimensions + fact
+Each batch is transformed and loaded before the next one is read, so memory stays
+bounded by the batch size rather than the file size.
 
 Usage:
   python etl.py --csv data/candidates.csv --db dw/dw_hiring.db --schema dw/schema.sql
@@ -12,8 +15,13 @@ Usage:
 from __future__ import annotations
 import argparse
 import sqlite3
+from itertools import chain, islice
 from pathlib import Path
+from typing import Iterable, Iterator
 import pandas as pd
+import polars as pl
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from rich.console import Console
 from rich.panel import Panel
 
@@ -36,130 +44,212 @@ COUNTRY_FIX = {
     'brasil': 'Brazil'
 }
 
+# Distinct (trimmed) country spelling → normalized name
+def country_lookup(countries: pl.Series) -> dict:
+    countries = countries.drop_nulls()
+    fixed = countries.str.to_lowercase().replace_strict(COUNTRY_FIX, default=countries.str.to_titlecase())
+    return dict(zip(countries.to_list(), fixed.to_list()))
+
 HIRED_THRESHOLD = 7
 
-def extract(csv_path: Path) -> pd.DataFrame:
-    console.rule("[bold cyan]1/6 Extract")
-    console.print(f"Reading CSV: [bold]{csv_path}[/bold]")
-    if not csv_path.exists():
-        raise FileNotFoundError(f"CSV not found at {csv_path}")
-    df = pd.read_csv(csv_path, sep=';')
-    df.columns = [c.strip().lower().replace(' ', '_') for c in df.columns]
-    return df
+# Bytes of CSV parsed per streamed batch (~150-200k rows)
+CSV_BLOCK_SIZE = 16 << 20
 
-def transform(df: pd.DataFrame) -> pd.DataFrame:
-    console.rule("[bold cyan]2/6 Transform")
-    console.print("Casting types and creating derived columns…")
+# Bulk-load friendly connection settings
+SQLITE_PRAGMAS = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -200000;
+"""
 
-    # Types
-    df['application_date'] = pd.to_datetime(df['application_date'], errors='coerce').dt.date.astype(str)
-    df['yoe'] = pd.to_numeric(df['yoe'], errors='coerce').fillna(0).astype(int)
-    df['code_challenge_score'] = pd.to_numeric(df['code_challenge_score'], errors='coerce')
-    df['technical_interview_score'] = pd.to_numeric(df['technical_interview_score'], errors='coerce')
+# Rows bound per multi-row INSERT (x9 fact columns stays under SQLite's 999-variable limit)
+ROWS_PER_INSERT = 100
 
-    # Basic cleanup
-    for col in ['first_name', 'last_name', 'email', 'country', 'seniority', 'technology']:
-        df[col] = df[col].astype(str).str.strip()
+def insert_rows(cur: sqlite3.Cursor, table: str, df: pd.DataFrame) -> None:
+    # Multi-row VALUES statements: one step per ROWS_PER_INSERT rows; leftovers go one by one
+    row = '(' + ', '.join('?' * df.shape[1]) + ')'
+    rows = df.itertuples(index=False, name=None)
+    batched = islice(rows, len(df) - len(df) % ROWS_PER_INSERT)
+    cur.executemany(
+        f"INSERT INTO {table} VALUES " + ', '.join([row] * ROWS_PER_INSERT),
+        (tuple(chain.from_iterable(group)) for group in zip(*[batched] * ROWS_PER_INSERT))
+    )
+    cur.executemany(f"INSERT INTO {table} VALUES {row}", rows)
 
-    # Country normalization
-    df['country'] = df['country'].str.lower().map(COUNTRY_FIX).fillna(df['country'].str.title())
+def extract(csv_path: Path) -> Iterator[pl.DataFrame]:
+    console.rule("[bold cyan]1/6 Extract")
+    console.print(f"Streaming CSV: [bold]{csv_path}[/bold]")
+    if not csv_path.exists():
+        raise FileNotFoundError(f"CSV not found at {csv_path}")
+    # Every column is read as text (empty → null) and typed in transform();
+    # the header comes from the same pyarrow parser as the rows
+    parse_options = pa_csv.ParseOptions(delimiter=';')
+    with pa_csv.open_csv(csv_path, parse_options=parse_options) as probe:
+        header = probe.schema.names
+    columns = [c.strip().lower().replace(' ', '_') for c in header]
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(column_names=columns, skip_rows=1, block_size=CSV_BLOCK_SIZE),
+        parse_options=parse_options,
+        convert_options=pa_csv.ConvertOptions(column_types={c: pa.string() for c in columns},
+                                              strings_can_be_null=True),
+    )
+    return (pl.from_arrow(batch) for batch in reader)
 
-    # HIRED rule
-    df['hired'] = ((df['code_challenge_score'] >= HIRED_THRESHOLD) &
-                   (df['technical_interview_score'] >= HIRED_THRESHOLD)).astype(int)
+TEXT_COLUMNS = ['first_name', 'last_name', 'email', 'country', 'seniority', 'technology']
 
-    # Date key
-    df['date_id'] = df['application_date'].replace('-', '', regex=True).astype(int)
+def transform(df: pl.DataFrame) -> pd.DataFrame:
+    # to_datetime parses both date-only and timestamp values (e.g. 2019-10-28 09:30:00)
+    application_date = (pl.col('application_date').str.strip_chars()
+                        .str.to_datetime(strict=False).dt.date())
+    code_score = pl.col('code_challenge_score')
+    tech_score = pl.col('technical_interview_score')
+    # Country spellings are few: normalize the distinct values once, then map
+    countries = country_lookup(df.get_column('country').str.strip_chars().unique())
 
-    # Experience band (for analysis; not loaded into DW)
-    bins = [-1, 2, 5, 10, 10**6]
-    labels = ['0-2', '3-5', '6-10', '11+']
-    df['yoe_band'] = pd.cut(df['yoe'], bins=bins, labels=labels)
+    out = (
+        df.lazy()
+        # Types + basic cleanup
+        .with_columns(
+            [pl.col(c).str.strip_chars() for c in TEXT_COLUMNS] + [
+                application_date.alias('application_date'),
+                pl.col('yoe').str.strip_chars().cast(pl.Float64, strict=False).fill_null(0).cast(pl.Int64),
+                code_score.str.strip_chars().cast(pl.Float64, strict=False),
+                tech_score.str.strip_chars().cast(pl.Float64, strict=False),
+            ]
+        )
+        .with_columns(
+            # Country normalization
+            pl.col('country').replace(countries),
+            # HIRED rule
+            ((code_score >= HIRED_THRESHOLD) & (tech_score >= HIRED_THRESHOLD))
+              .fill_null(False).cast(pl.Int8).alias('hired'),
+            # Date key (yyyymmdd)
+            (pl.col('application_date').dt.year().cast(pl.Int64) * 10000
+             + pl.col('application_date').dt.month().cast(pl.Int64) * 100
+             + pl.col('application_date').dt.day().cast(pl.Int64)).alias('date_id'),
+        )
+        .collect()
+    )
 
-    return df
+    # Hand off to pandas (Arrow-backed) for the load step
+    return out.to_pandas(use_pyarrow_extension_array=True)
 
-def load_to_dw(df: pd.DataFrame, db_path: Path, schema_path: Path) -> None:
-    console.rule("[bold cyan]3/6 Load → DW")
+def load_to_dw(batches: Iterable[pd.DataFrame], db_path: Path, schema_path: Path) -> None:
+    console.rule("[bold cyan]2/6 Transform + 3/6 Load → DW (per batch)")
     console.print(f"Connecting to SQLite at [bold]{db_path}[/bold]")
     ensure_dirs(db_path)
     with sqlite3.connect(db_path) as con:
         cur = con.cursor()
+        cur.executescript(SQLITE_PRAGMAS)
         # 3.1 Create schema
         console.print(f"Applying DDL: [italic]{schema_path}[/italic]")
         ddl = Path(schema_path).read_text(encoding='utf-8')
         cur.executescript(ddl)
 
-        # 3.2 DimDate
-        console.print("Loading DimDate / other dimensions…")
-        dates = (
-            df[['date_id', 'application_date']]
-            .drop_duplicates()
-            .rename(columns={'application_date': 'full_date'})
-        )
-        dates['year'] = dates['full_date'].str.slice(0, 4).astype(int)
-        dates['month'] = dates['full_date'].str.slice(5, 7).astype(int)
-        dates['day'] = dates['full_date'].str.slice(8, 10).astype(int)
-        dates['quarter'] = ((dates['month'] - 1) // 3 + 1).astype(int)
-        month_names = ['January','February','March','April','May','June','July','August','September','October','November','December']
-        dates['month_name'] = dates['month'].apply(lambda m: month_names[m-1])
-        cur.executemany(
-            """            INSERT OR IGNORE INTO DimDate(date_id, full_date, day, month, month_name, quarter, year)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,            dates[['date_id','full_date','day','month','month_name','quarter','year']].itertuples(index=False)
+        # Dimensions + fact are loaded in a single transaction
+        cur.execute('BEGIN')
+        # Fact rows are staged with their natural keys; SQLite resolves the FKs
+        cur.execute(
+            """            CREATE TEMP TABLE stage_fact(
+                email TEXT, technology TEXT, seniority TEXT, country TEXT, date_id INTEGER,
+                yoe INTEGER, code_challenge_score REAL, technical_interview_score REAL, hired INTEGER)
+            """
         )
 
+        # Keys already in the DW: each batch only inserts unseen ones, so ignored
+        # conflicts never burn AUTOINCREMENT ids
+        def existing(table: str, column: str) -> set:
+            return {row[0] for row in cur.execute(f"SELECT {column} FROM {table}")}
+
+        seen = {
+            'technology': existing('DimTechnology', 'technology'),
+            'seniority':  existing('DimSeniority', 'seniority'),
+            'country':    existing('DimCountry', 'country'),
+            'email':      existing('DimCandidate', 'email'),
+        }
+
         # Other dimensions from unique values
-        def insert_unique(table: str, column: str, values):
+        def insert_unique(df: pd.DataFrame, table: str, column: str):
+            values = set(df[column].dropna().unique()) - seen[column]
+            seen[column] |= values
             cur.executemany(
                 f"INSERT OR IGNORE INTO {table}({column}) VALUES (?)",
-                [(str(v),) for v in sorted(pd.Series(values).dropna().unique().tolist())]
+                ((str(v),) for v in sorted(values))
             )
 
-        insert_unique('DimTechnology', 'technology', df['technology'])
-        insert_unique('DimSeniority', 'seniority',  df['seniority'])
-        insert_unique('DimCountry',    'country',    df['country'])
+        inserted = 0
+        for n, df in enumerate(batches, start=1):
+            console.print(f"Batch {n}: {len(df)} rows → dimensions + FactHiring…")
 
-        # DimCandidate (unique by email)
-        candidates = df[['first_name','last_name','email']].drop_duplicates('email')
-        cur.executemany(
-            """            INSERT OR IGNORE INTO DimCandidate(first_name, last_name, email)
-            VALUES (?, ?, ?)
-            """,            candidates.itertuples(index=False, name=None)
-        )
+            # 3.2 DimDate
+            # application_date stays a typed date; only DimDate needs the ISO string
+            dates = df.loc[~df['date_id'].duplicated(), ['date_id', 'application_date']].copy()
+            app_date = dates['application_date'].dt
+            dates['full_date'] = app_date.strftime('%Y-%m-%d')
+            dates['year'] = app_date.year.astype(int)
+            dates['month'] = app_date.month.astype(int)
+            dates['day'] = app_date.day.astype(int)
+            dates['quarter'] = app_date.quarter.astype(int)
+            dates['month_name'] = app_date.month_name()
+            cur.executemany(
+                """                INSERT OR IGNORE INTO DimDate(date_id, full_date, day, month, month_name, quarter, year)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,                dates[['date_id','full_date','day','month','month_name','quarter','year']].itertuples(index=False)
+            )
 
-        # ID maps
-        def build_map(sql: str) -> dict:
-            return {row[1]: row[0] for row in cur.execute(sql).fetchall()}
-
-        map_tech = build_map("SELECT technology_id, technology FROM DimTechnology")
-        map_sen  = build_map("SELECT seniority_id, seniority FROM DimSeniority")
-        map_cty  = build_map("SELECT country_id, country FROM DimCountry")
-        map_cnd  = build_map("SELECT candidate_id, email FROM DimCandidate")
-
-        # Fact
-        console.print("Inserting rows into FactHiring…")
-        rows = []
-        for r in df.itertuples(index=False):
-            rows.append((
-                map_cnd[r.email],
-                map_tech[r.technology],
-                map_sen[r.seniority],
-                map_cty[r.country],
-                r.date_id,
-                int(r.yoe),
-                float(r.code_challenge_score),
-                float(r.technical_interview_score),
-                int(r.hired)
-            ))
-        cur.executemany(
-            """            INSERT INTO FactHiring(
-                candidate_id, technology_id, seniority_id, country_id, date_id,
-                yoe, code_challenge_score, technical_interview_score, hired)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,            rows
-        )
+            # New values only; earlier batches (or loads) already inserted the rest
+            insert_unique(df, 'DimTechnology', 'technology')
+            insert_unique(df, 'DimSeniority',  'seniority')
+            insert_unique(df, 'DimCountry',    'country')
+
+            # DimCandidate (unique by email; first occurrence across batches wins)
+            # Dedup on the single email column, then pick the three columns
+            candidates = df.loc[~df['email'].duplicated(), ['first_name','last_name','email']]
+            candidates = candidates[~candidates['email'].isin(seen['email'])]
+            seen['email'].update(candidates['email'])
+            cur.executemany(
+                """                INSERT OR IGNORE INTO DimCandidate(first_name, last_name, email)
+                VALUES (?, ?, ?)
+                """,                candidates.itertuples(index=False, name=None)
+            )
+
+            # Fact
+            stage = pd.DataFrame({
+                'email': df['email'],
+                'technology': df['technology'],
+                'seniority': df['seniority'],
+                'country': df['country'],
+                'date_id': df['date_id'].astype('int64'),
+                'yoe': df['yoe'].astype('int64'),
+                'code_challenge_score': df['code_challenge_score'].astype('float64'),
+                'technical_interview_score': df['technical_interview_score'].astype('float64'),
+                'hired': df['hired'].astype('int64'),
+            })
+            insert_rows(cur, 'stage_fact', stage)
+            cur.execute(
+                """                INSERT INTO FactHiring(
+                    candidate_id, technology_id, seniority_id, country_id, date_id,
+                    yoe, code_challenge_score, technical_interview_score, hired)
+                SELECT c.candidate_id, t.technology_id, s.seniority_id, k.country_id, f.date_id,
+                       f.yoe, f.code_challenge_score, f.technical_interview_score, f.hired
+                FROM stage_fact f
+                JOIN DimCandidate  c ON c.email = f.email
+                JOIN DimTechnology t ON t.technology = f.technology
+                JOIN DimSeniority  s ON s.seniority = f.seniority
+                JOIN DimCountry    k ON k.country = f.country
+                ORDER BY f.rowid
+                """
+            )
+            inserted += cur.rowcount
+            cur.execute('DELETE FROM stage_fact')
+
+        cur.execute('DROP TABLE stage_fact')
         con.commit()
-        console.print(Panel.fit(f"Load complete: {len(rows)} rows inserted into FactHiring"))
+        # Refresh planner statistics so KPI queries pick the covering indexes
+        cur.execute('ANALYZE')
+        console.print(Panel.fit(f"Load complete: {inserted} rows inserted into FactHiring"))
 
 def main():
     args = parse_args()
@@ -167,9 +257,8 @@ def main():
     db_path = Path(args.db)
     schema_path = Path(args.schema)
 
-    df = extract(csv_path)
-    df = transform(df)
-    load_to_dw(df, db_path, schema_path)
+    batches = extract(csv_path)
+    load_to_dw((transform(batch) for batch in batches), db_path, schema_path)
 
 if __name__ == '__main__':
     main()
@@ -1,16 +1,25 @@
 #!/usr/bin/env python3
 # Generates charts from the DW:
 # - PNGs (matplotlib): technology, year, seniority, avg_scores_by_hired, yoe_band
-# - HTML (plotly): country over years, avg_scores_by_hired, yoe_band
+# - HTML (plotly): country over years, avg_scores_by_hired, yoe_band — all in docs/index.html,
+#   one shared page that loads Plotly.js once and draws each figure from its JSON
+# Importable: run_all.py calls render() directly (possibly off the main thread).
 import sqlite3
 from pathlib import Path
+import matplotlib
+matplotlib.use('Agg')  # headless; safe outside the main thread
 import matplotlib.pyplot as plt
+import pandas as pd
+try:
+    # Interactive HTML charts are optional; without plotly only the PNGs are written
+    import plotly.express as px
+    from plotly.offline import get_plotlyjs_version
+except ImportError:
+    px = None
 
 DB = Path('dw/dw_hiring.db')
 OUT_PNG = Path('visuals')
 OUT_HTML = Path('docs')
-OUT_PNG.mkdir(parents=True, exist_ok=True)
-OUT_HTML.mkdir(parents=True, exist_ok=True)
 
 SQL_TECH = """
 SELECT t.technology AS label, SUM(f.hired) AS hires
@@ -55,7 +64,7 @@ GROUP BY hired
 ORDER BY hired DESC
 """
 
-# YOE band computed on the fly (same bins as ETL: 0-2, 3-5, 6-10, 11+)
+# YOE band computed on the fly (bins: 0-2, 3-5, 6-10, 11+)
 SQL_HIRES_BY_YOE_BAND = """
 SELECT CASE
          WHEN f.yoe < 3 THEN '0-2'
@@ -74,111 +83,146 @@ ORDER BY CASE label
          END
 """
 
-def save_bar_png(labels, values, title, filename, xlabel=None, ylabel=None, rotate_x=True):
-    plt.figure()
-    plt.title(title)
-    plt.bar(labels, values)
+# Shared page for the interactive charts: {plotlyjs} URL, {divs}, {payload} figure JSON
+HTML_SHELL = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Hiring KPIs</title>
+<script src="{plotlyjs}"></script>
+</head>
+<body>
+{divs}
+<script>
+const FIGS = {payload};
+for (const [name, fig] of Object.entries(FIGS)) {{
+  Plotly.newPlot(name, fig.data, fig.layout);
+}}
+</script>
+</body>
+</html>
+"""
+
+def write_html_charts(figs: dict, filename):
+    divs = '\n'.join(f'<div id="{name}"></div>' for name in figs)
+    # Figure JSON goes in verbatim, no parse/re-dump (Plotly already escapes '<' and '/')
+    payload = '{' + ', '.join(f'"{name}": {fig.to_json()}' for name, fig in figs.items()) + '}'
+    html = HTML_SHELL.format(plotlyjs=f'https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js',
+                             divs=divs, payload=payload)
+    (OUT_HTML / filename).write_text(html, encoding='utf-8')
+
+# Both helpers draw on one shared Axes (cleared first) instead of a new figure per chart
+def save_bar_png(ax, labels, values, title, filename, xlabel=None, ylabel=None, rotate_x=True):
+    ax.clear()
+    ax.set_title(title)
+    ax.bar(labels, values)
     if rotate_x:
-        plt.xticks(rotation=45, ha='right')
+        plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
     if xlabel:
-        plt.xlabel(xlabel)
+        ax.set_xlabel(xlabel)
     if ylabel:
-        plt.ylabel(ylabel)
-    plt.tight_layout()
-    plt.savefig(OUT_PNG / filename)
-    plt.close()
-
-def save_line_png(x, y, title, filename, xlabel=None, ylabel=None):
-    plt.figure()
-    plt.title(title)
-    plt.plot(x, y, marker='o')
+        ax.set_ylabel(ylabel)
+    ax.figure.tight_layout()
+    ax.figure.savefig(OUT_PNG / filename)
+
+def save_line_png(ax, x, y, title, filename, xlabel=None, ylabel=None):
+    ax.clear()
+    ax.set_title(title)
+    ax.plot(x, y, marker='o')
     if xlabel:
-        plt.xlabel(xlabel)
+        ax.set_xlabel(xlabel)
     if ylabel:
-        plt.ylabel(ylabel)
-    plt.tight_layout()
-    plt.savefig(OUT_PNG / filename)
-    plt.close()
-
-with sqlite3.connect(DB) as con:
-    # --- Hires by Technology (PNG)
-    rows = con.execute(SQL_TECH).fetchall()
-    if rows:
-        labels, values = zip(*rows)
-        save_bar_png(labels, values, 'Hires by Technology', 'hires_by_technology.png',
-                     xlabel='Technology', ylabel='Hires')
-
-    # --- Hires by Year (PNG)
-    rows = con.execute(SQL_YEAR).fetchall()
-    if rows:
-        years, values = zip(*rows)
-        save_line_png(years, values, 'Hires by Year', 'hires_by_year.png',
-                      xlabel='Year', ylabel='Hires')
-
-    # --- Hires by Seniority (PNG)
-    rows = con.execute(SQL_SENIORITY).fetchall()
-    if rows:
-        labels, values = zip(*rows)
-        save_bar_png(labels, values, 'Hires by Seniority', 'hires_by_seniority.png',
-                     xlabel='Seniority', ylabel='Hires')
-
-    # --- Country over Years (HTML, interactive)
-    try:
-        import pandas as pd
-        import plotly.express as px
-        df_country = pd.read_sql_query(SQL_COUNTRY_YEAR, con)
-        if not df_country.empty:
-            fig = px.line(df_country, x='year', y='hires', color='country', markers=True,
-                          title='Hires by Country over Years')
-            fig.write_html(OUT_HTML / 'hires_by_country_over_years.html', include_plotlyjs='cdn')
-    except Exception:
-        pass
-
-    # --- Avg Scores by Hired (PNG + HTML)
-    try:
-        import pandas as pd
-        import plotly.express as px
-        df_scores = pd.read_sql_query(SQL_AVG_SCORES_BY_HIRED, con)
-        if not df_scores.empty:
-            # PNG (two bars per metric side by side)
-            labels = df_scores['label'].tolist()
-            plt.figure()
-            plt.title('Average Scores by Hired Status')
-            # simple grouped bars without choosing colors
-            x = range(len(labels))
-            width = 0.35
-            plt.bar([i - width/2 for i in x], df_scores['avg_code_challenge'], width, label='Code Challenge')
-            plt.bar([i + width/2 for i in x], df_scores['avg_tech_interview'], width, label='Technical Interview')
-            plt.xticks(list(x), labels)
-            plt.ylabel('Average Score')
-            plt.legend()
-            plt.tight_layout()
-            plt.savefig(OUT_PNG / 'avg_scores_by_hired.png')
-            plt.close()
-
-            # HTML interactive
-            df_melt = df_scores.melt(id_vars='label',
-                                     value_vars=['avg_code_challenge','avg_tech_interview'],
-                                     var_name='metric', value_name='avg_score')
-            fig = px.bar(df_melt, x='label', y='avg_score', color='metric',
-                         title='Average Scores by Hired Status', barmode='group')
-            fig.write_html(OUT_HTML / 'avg_scores_by_hired.html', include_plotlyjs='cdn')
-    except Exception:
-        pass
-
-    # --- Hires by YOE band (PNG + HTML)
-    try:
-        import pandas as pd
-        import plotly.express as px
-        df_yoe = pd.read_sql_query(SQL_HIRES_BY_YOE_BAND, con)
-        if not df_yoe.empty:
-            save_bar_png(df_yoe['label'].tolist(), df_yoe['hires'].tolist(),
-                         'Hires by YOE Band', 'hires_by_yoe_band.png',
-                         xlabel='YOE Band', ylabel='Hires', rotate_x=False)
-
-            fig = px.bar(df_yoe, x='label', y='hires', title='Hires by YOE Band')
-            fig.write_html(OUT_HTML / 'hires_by_yoe_band.html', include_plotlyjs='cdn')
-    except Exception:
-        pass
-
-print(f"PNG → {OUT_PNG.resolve()} | HTML → {OUT_HTML.resolve()}")
+        ax.set_ylabel(ylabel)
+    ax.figure.tight_layout()
+    ax.figure.savefig(OUT_PNG / filename)
+
+def render(db_path: Path = DB):
+    OUT_PNG.mkdir(parents=True, exist_ok=True)
+    OUT_HTML.mkdir(parents=True, exist_ok=True)
+
+    png_fig, ax = plt.subplots()
+    html_figs = {}
+    with sqlite3.connect(db_path) as con:
+        # --- Hires by Technology (PNG)
+        rows = con.execute(SQL_TECH).fetchall()
+        if rows:
+            labels, values = zip(*rows)
+            save_bar_png(ax, labels, values, 'Hires by Technology', 'hires_by_technology.png',
+                         xlabel='Technology', ylabel='Hires')
+
+        # --- Hires by Year (PNG)
+        rows = con.execute(SQL_YEAR).fetchall()
+        if rows:
+            years, values = zip(*rows)
+            save_line_png(ax, years, values, 'Hires by Year', 'hires_by_year.png',
+                          xlabel='Year', ylabel='Hires')
+
+        # --- Hires by Seniority (PNG)
+        rows = con.execute(SQL_SENIORITY).fetchall()
+        if rows:
+            labels, values = zip(*rows)
+            save_bar_png(ax, labels, values, 'Hires by Seniority', 'hires_by_seniority.png',
+                         xlabel='Seniority', ylabel='Hires')
+
+        # --- Country over Years (HTML, interactive)
+        try:
+            if px is not None:
+                df_country = pd.read_sql_query(SQL_COUNTRY_YEAR, con)
+                if not df_country.empty:
+                    html_figs['hires_by_country_over_years'] = px.line(
+                        df_country, x='year', y='hires', color='country', markers=True,
+                        title='Hires by Country over Years')
+        except Exception:
+            pass
+
+        # --- Avg Scores by Hired (PNG + HTML)
+        try:
+            df_scores = pd.read_sql_query(SQL_AVG_SCORES_BY_HIRED, con)
+            if not df_scores.empty:
+                # PNG (two bars per metric side by side)
+                labels = df_scores['label'].tolist()
+                ax.clear()
+                ax.set_title('Average Scores by Hired Status')
+                # simple grouped bars without choosing colors
+                x = range(len(labels))
+                width = 0.35
+                ax.bar([i - width/2 for i in x], df_scores['avg_code_challenge'], width, label='Code Challenge')
+                ax.bar([i + width/2 for i in x], df_scores['avg_tech_interview'], width, label='Technical Interview')
+                ax.set_xticks(list(x), labels)
+                ax.set_ylabel('Average Score')
+                ax.legend()
+                png_fig.tight_layout()
+                png_fig.savefig(OUT_PNG / 'avg_scores_by_hired.png')
+
+                # HTML interactive
+                if px is not None:
+                    df_melt = df_scores.melt(id_vars='label',
+                                             value_vars=['avg_code_challenge','avg_tech_interview'],
+                                             var_name='metric', value_name='avg_score')
+                    html_figs['avg_scores_by_hired'] = px.bar(
+                        df_melt, x='label', y='avg_score', color='metric',
+                        title='Average Scores by Hired Status', barmode='group')
+        except Exception:
+            pass
+
+        # --- Hires by YOE band (PNG + HTML)
+        try:
+            df_yoe = pd.read_sql_query(SQL_HIRES_BY_YOE_BAND, con)
+            if not df_yoe.empty:
+                save_bar_png(ax, df_yoe['label'].tolist(), df_yoe['hires'].tolist(),
+                             'Hires by YOE Band', 'hires_by_yoe_band.png',
+                             xlabel='YOE Band', ylabel='Hires', rotate_x=False)
+
+                if px is not None:
+                    html_figs['hires_by_yoe_band'] = px.bar(df_yoe, x='label', y='hires',
+                                                            title='Hires by YOE Band')
+        except Exception:
+            pass
+
+    plt.close(png_fig)
+    if html_figs:
+        write_html_charts(html_figs, 'index.html')
+    print(f"PNG → {OUT_PNG.resolve()} | HTML → {OUT_HTML.resolve()}")
+
+if __name__ == '__main__':
+    render()
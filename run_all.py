@@ -4,13 +4,15 @@ Run-all pipeline:
 - (Optional) Rebuild DW by running etl.py if --rebuild is passed
 - Execute ALL KPI queries (defined here) against the DW
 - Save each KPI result as CSV (and one consolidated Excel) under kpi/out/
-- Generate charts (PNG + HTML) by calling kpi/visualizations.py
+- Generate charts (PNG + HTML) with kpi/visualizations.py, alongside the KPIs
 
 Usage:
   python run_all.py --rebuild
 """
 
-import argparse, sqlite3, subprocess, sys
+import argparse, csv, sqlite3, subprocess, sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from pathlib import Path
 import pandas as pd
 
@@ -88,38 +90,67 @@ def run_etl_if_requested(args):
     print("[RUN]", " ".join(str(x) for x in cmd))
     subprocess.run(cmd, check=True)
 
+def run_kpi(db_path: Path, out_dir: Path, name: str, sql: str):
+    # One connection per worker: SQLite serves concurrent readers
+    with closing(sqlite3.connect(db_path)) as con:
+        cur = con.execute(sql)
+        columns = [d[0] for d in cur.description]
+        rows = cur.fetchall()
+    # Cursor rows straight to CSV; no DataFrame needed
+    with open(out_dir / f"{name}.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(columns)
+        w.writerows(rows)
+    return name, (columns, rows)
+
+def source_stamp(db_path: Path) -> str:
+    # What kpis.xlsx is built from: the DW (path + mtime), its WAL (uncheckpointed
+    # writes live there) and this file (the KPI SQL). Empty WALs carry no changes.
+    wal = db_path.with_name(db_path.name + "-wal")
+    lines = [f"db={db_path.resolve()}"]
+    for src in (db_path, wal, Path(__file__)):
+        st = src.stat() if src.exists() else None
+        lines.append(f"{src.name}={st.st_mtime_ns if st and st.st_size else '-'}")
+    return "\n".join(lines) + "\n"
+
 def run_kpis(db_path: Path) -> dict:
+    # name → (columns, rows); pandas is only used to build the Excel workbook
     out_dir = ROOT / "kpi" / "out"
     out_dir.mkdir(parents=True, exist_ok=True)
-    results = {}
-    with sqlite3.connect(db_path) as con:
-        for name, sql in KPI_SQL.items():
-            df = pd.read_sql_query(sql, con)
-            df.to_csv(out_dir / f"{name}.csv", index=False)
-            results[name] = df
-    # Save all as Excel too
+    stamp = source_stamp(db_path)  # taken before reading, so later changes force a rebuild
+    with ThreadPoolExecutor(max_workers=len(KPI_SQL)) as ex:
+        futures = [ex.submit(run_kpi, db_path, out_dir, name, sql) for name, sql in KPI_SQL.items()]
+        results = dict(f.result() for f in futures)
+    # Save all as Excel too, unless the workbook was built from this exact DW state
     xlsx = out_dir / "kpis.xlsx"
-    with pd.ExcelWriter(xlsx, engine="xlsxwriter") as writer:
-        for name, df in results.items():
-            sheet = name[:31]
-            df.to_excel(writer, sheet_name=sheet, index=False)
+    stamp_file = out_dir / "kpis.xlsx.stamp"
+    if xlsx.exists() and stamp_file.exists() and stamp_file.read_text(encoding="utf-8") == stamp:
+        print(f"[SKIP] {xlsx.name} is up to date")
+    else:
+        with pd.ExcelWriter(xlsx, engine="xlsxwriter") as writer:
+            for name, (columns, rows) in results.items():
+                sheet = name[:31]
+                pd.DataFrame.from_records(rows, columns=columns).to_excel(writer, sheet_name=sheet, index=False)
+        stamp_file.write_text(stamp, encoding="utf-8")
     print(f"[OK] KPIs saved in {out_dir}")
     return results
 
-def run_charts():
-    viz = ROOT / "kpi" / "visualizations.py"
-    if viz.exists():
-        cmd = [sys.executable, str(viz)]
-        print("[RUN]", " ".join(str(x) for x in cmd))
-        subprocess.run(cmd, check=True)
-    else:
-        print("[WARN] visualizations.py not found; skipping charts.")
+def run_charts(db_path: Path):
+    # Imported in-process: no extra interpreter start-up
+    from kpi import visualizations
+    print("[RUN] kpi/visualizations.py")
+    visualizations.render(db_path)
 
 def main():
     args = parse_args()
     run_etl_if_requested(args)
-    run_kpis(Path(args.db))
-    run_charts()
+    db_path = Path(args.db)
+    # KPIs and charts only read the DW, so they can overlap
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        kpis = ex.submit(run_kpis, db_path)
+        charts = ex.submit(run_charts, db_path)
+        kpis.result()
+        charts.result()
     print("[DONE] All queries executed and charts saved.")
 
 if __name__ == "__main__":